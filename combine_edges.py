@@ -10,40 +10,436 @@ python combine_edges.py  <folder>  -o   my_result.edge
 python combine_edges.py  <folder>  -p   8            # 8-decimal precision
 python combine_edges.py  <folder>  -a                # sort alphabetically
 python combine_edges.py  <folder>  -s                # sort by size (largest first)
+python combine_edges.py  <folder>  --sparse          # Matrix Market output (total.mtx)
+python combine_edges.py  <folder>  -b                # binary NumPy output (total.npy)
+python combine_edges.py  <folder>  --coo             # "row col value" triplets (total.coo)
+python combine_edges.py  <folder>  --dtype float32   # half the memory of float64
+python combine_edges.py  <folder>  -j   4            # read with 4 worker processes
 """
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 import argparse
+import mmap
+import os
+from typing import List, Optional, Tuple
 import numpy as np
-from scipy.linalg import block_diag
+from numpy.typing import DTypeLike
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; read_edge falls back to np.loadtxt
+    njit = None
+
+
+# Folders with fewer files than this are read sequentially; below it the
+# cost of starting worker processes outweighs the parallel parse.
+PARALLEL_MIN_FILES = 4
+
+# Largest integer a float64 holds exactly, and the powers of ten that are
+# exact as float64: together they bound Clinger's exact fast path.
+_MAX_EXACT_MANTISSA = 2 ** 53
+_POW10 = np.array([10.0 ** k for k in range(23)])
+
+# Parsed blocks from earlier ``read_edges(..., cache=True)`` calls, keyed on
+# (path, mtime, size, dtype) and kept in least-recently-used order, up to a
+# total of BLOCK_CACHE_BYTES; _block_cache_bytes is their running total.
+BLOCK_CACHE_BYTES = 512 * 2 ** 20
+_block_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_block_cache_bytes = 0
 
 
 # ---------- helper functions ----------------------------------------------- #
 
+def _row_width(buf) -> int:
+    """Count the values on the first non-blank line of ``buf`` (bytes or mmap)."""
+    start = 0
+    while True:
+        end = buf.find(b"\n", start)
+        line = buf[start:] if end < 0 else buf[start:end]
+        if end < 0 or line.strip():
+            return len(line.split())
+        start = end + 1
+
+
 def edge_size(path: Path) -> int:
     """Return the matrix dimension by counting non-blank lines."""
-    with path.open() as f:
-        return sum(1 for line in f if line.strip())
-
-
-def read_edge(path: Path) -> np.ndarray:
-    """Load a square whitespace-delimited .edge file into a NumPy array."""
-    rows = [
-        [float(tok) for tok in ln.strip().split()]
-        for ln in path.read_text().splitlines()
-        if ln.strip()
-    ]
-    arr = np.asarray(rows, float)
+    return sum(1 for line in path.read_bytes().split(b"\n") if line.strip())
+
+
+def _parse_edge(buf: np.ndarray, out: np.ndarray) -> bool:
+    """Parse the uint8 text ``buf`` into the preallocated n×n array ``out``.
+
+    Only plain decimal numbers (``-1.25``, ``3e-4``) whose value is exactly
+    representable via Clinger's fast path are handled, so every result is
+    correctly rounded.  Returns False as soon as anything else turns up
+    (nan, very long mantissas, ragged rows, stray characters) and leaves the
+    file to np.loadtxt.  Compiled with numba when it is installed.
+    """
+    n = out.shape[0]
+    size = buf.shape[0]
+    row = 0
+    col = 0
+    i = 0
+    while i < size:
+        c = buf[i]
+        if c == 10:  # newline ends a non-blank row
+            if col:
+                if col != n:
+                    return False
+                row += 1
+                col = 0
+            i += 1
+            continue
+        if c == 32 or c == 9 or c == 13 or c == 11 or c == 12:
+            i += 1
+            continue
+        if row >= n or col >= n:
+            return False
+
+        negative = c == 45
+        if c == 45 or c == 43:  # '-' or '+'
+            i += 1
+        mantissa = 0
+        zeros = 0         # trailing zeros not yet folded into the mantissa
+        frac_digits = 0
+        seen_digit = False
+        seen_point = False
+        while i < size:
+            c = buf[i]
+            if 48 <= c <= 57:
+                seen_digit = True
+                if seen_point:
+                    frac_digits += 1
+                if c == 48:
+                    zeros += 1
+                else:
+                    for _ in range(zeros + 1):
+                        mantissa *= 10
+                        if mantissa > _MAX_EXACT_MANTISSA:
+                            return False
+                    mantissa += c - 48
+                    if mantissa > _MAX_EXACT_MANTISSA:
+                        return False
+                    zeros = 0
+            elif c == 46 and not seen_point:  # '.'
+                seen_point = True
+            else:
+                break
+            i += 1
+        if not seen_digit:
+            return False
+
+        exponent = 0
+        if i < size and (buf[i] == 101 or buf[i] == 69):  # 'e' or 'E'
+            i += 1
+            exp_negative = False
+            if i < size and (buf[i] == 45 or buf[i] == 43):
+                exp_negative = buf[i] == 45
+                i += 1
+            if i >= size or not 48 <= buf[i] <= 57:
+                return False
+            while i < size and 48 <= buf[i] <= 57:
+                if exponent < 10000:
+                    exponent = exponent * 10 + (buf[i] - 48)
+                i += 1
+            if exp_negative:
+                exponent = -exponent
+        if i < size and not (buf[i] == 32 or 9 <= buf[i] <= 13):
+            return False
+
+        value = 0.0
+        if mantissa:
+            scale = zeros - frac_digits + exponent
+            if scale < -22 or scale > 22:
+                return False
+            if scale < 0:
+                value = mantissa / _POW10[-scale]
+            else:
+                value = mantissa * _POW10[scale]
+        out[row, col] = -value if negative else value
+        col += 1
+
+    if col:  # last row without a trailing newline
+        if col != n:
+            return False
+        row += 1
+    return row == n
+
+
+_parse_edge_jit = (njit(cache=True, nogil=True)(_parse_edge)
+                   if njit is not None else None)
+
+
+def _load_edge(path: Path, dtype: DTypeLike = np.float64) -> np.ndarray:
+    """Parse a square .edge file, bypassing the block cache."""
+    dtype = np.dtype(dtype)
+    if _parse_edge_jit is not None and path.stat().st_size:
+        # Parse straight out of the page cache: no read() copy of the text
+        with path.open("rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # A square file has as many rows as its first row has values,
+            # and each value takes at least a digit plus a separator
+            n = _row_width(mm)
+            parsed = False
+            # (a whitespace-only file gives n == 0 and is left to loadtxt)
+            if 0 < n and n * n <= (len(mm) + 1) // 2:
+                # numba has no float16 support: parse half precision as float64
+                out = np.empty((n, n),
+                               dtype=np.float64 if dtype == np.float16 else dtype)
+                text = np.frombuffer(mm, np.uint8)
+                parsed = _parse_edge_jit(text, out)
+                del text  # release the view so the map can close
+        if parsed:
+            return out.astype(dtype, copy=False)
+    # loadtxt's C tokenizer skips blank lines; ndmin=2 keeps 1×1 files square.
+    # It also covers whatever the fast parser declines and reports bad files.
+    arr = np.loadtxt(path, dtype=dtype, ndmin=2)
     if arr.shape[0] != arr.shape[1]:
         raise ValueError(f"{path} is not square")
     return arr
 
 
+def _cache_key(path: Path, dtype: DTypeLike) -> Tuple:
+    """Key a parsed block on the file's identity and the requested dtype."""
+    st = path.stat()
+    return (path, st.st_mtime_ns, st.st_size, np.dtype(dtype).str)
+
+
+def _cache_get(key: Tuple) -> Optional[np.ndarray]:
+    """Return a cached block and mark it most recently used, or None."""
+    arr = _block_cache.get(key)
+    if arr is not None:
+        _block_cache.move_to_end(key)
+    return arr
+
+
+def _cache_put(key: Tuple, arr: np.ndarray) -> None:
+    """Freeze ``arr`` and cache it, evicting the oldest blocks over budget."""
+    global _block_cache_bytes
+    arr.setflags(write=False)  # shared between callers from now on
+    if arr.nbytes > BLOCK_CACHE_BYTES:
+        return
+    old = _block_cache.pop(key, None)
+    if old is not None:
+        _block_cache_bytes -= old.nbytes
+    _block_cache[key] = arr
+    _block_cache_bytes += arr.nbytes
+    while _block_cache_bytes > BLOCK_CACHE_BYTES:
+        _, evicted = _block_cache.popitem(last=False)
+        _block_cache_bytes -= evicted.nbytes
+
+
+def clear_block_cache() -> None:
+    """Drop every block kept by ``read_edges(..., cache=True)``."""
+    global _block_cache_bytes
+    _block_cache.clear()
+    _block_cache_bytes = 0
+
+
+def read_edge(path: Path, dtype: DTypeLike = np.float64,
+              cache: bool = False) -> np.ndarray:
+    """Load a square whitespace-delimited .edge file into a NumPy array.
+
+    See ``read_edges`` for ``cache``.
+    """
+    return read_edges([path], jobs=1, dtype=dtype, cache=cache)[0]
+
+
+def read_edges(paths: List[Path],
+               jobs: Optional[int] = None,
+               dtype: DTypeLike = np.float64,
+               cache: bool = False) -> List[np.ndarray]:
+    """Read several .edge files, in parallel worker processes when worthwhile.
+
+    Results come back in the order of ``paths``.  ``jobs`` caps the number of
+    workers (default: one per CPU); ``jobs=1`` forces a sequential read.
+
+    With ``cache=True`` parsed blocks are kept in this process while each
+    file's mtime and size are unchanged, and only the misses are handed to
+    the workers.  Cached arrays are shared between calls, so they come back
+    read-only; copy one before modifying it.
+    """
+    if cache:
+        keys = [_cache_key(p, dtype) for p in paths]
+        blocks = [_cache_get(k) for k in keys]
+    else:
+        blocks = [None] * len(paths)
+    missing = [i for i, b in enumerate(blocks) if b is None]
+    if jobs == 1 or len(missing) < PARALLEL_MIN_FILES:
+        loaded = [_load_edge(paths[i], dtype) for i in missing]
+    else:
+        workers = jobs or os.cpu_count() or 1
+        # Batch several files per task so small files don't each pay an
+        # inter-process round trip
+        chunksize = max(1, len(missing) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            loaded = list(ex.map(partial(_load_edge, dtype=dtype),
+                                 [paths[i] for i in missing],
+                                 chunksize=chunksize))
+    for i, arr in zip(missing, loaded):
+        if cache:
+            _cache_put(keys[i], arr)
+        blocks[i] = arr
+    return blocks
+
+
+def block_diag(blocks: List[np.ndarray], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Place square blocks along the diagonal of one preallocated matrix.
+
+    ``out`` may supply a zero-filled N × N array to fill (a memmap, say);
+    otherwise a new one is allocated.
+    """
+    sizes = np.array([b.shape[0] for b in blocks])
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    n = int(offsets[-1])
+    if out is None:
+        out = np.zeros((n, n), dtype=np.result_type(*blocks))
+    for b, start, stop in zip(blocks, offsets[:-1], offsets[1:]):
+        out[start:stop, start:stop] = b
+    return out
+
+
+def pack_blocks(blocks: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate the blocks into one contiguous 1-D array.
+
+    Returns ``(data, offsets)``: each block is stored row-major, one after the
+    other, and ``offsets`` holds the block boundaries in the combined matrix
+    (``[0, n_1, n_1 + n_2, ..., N]``).  ``unpack_blocks`` reverses this.
+    """
+    sizes = np.array([b.shape[0] for b in blocks], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    data = np.empty(int((sizes ** 2).sum()), dtype=np.result_type(*blocks))
+    pos = 0
+    for b in blocks:
+        data[pos:pos + b.size] = b.ravel()
+        pos += b.size
+    return data, offsets
+
+
+def unpack_blocks(data: np.ndarray, offsets: np.ndarray) -> List[np.ndarray]:
+    """Return the square blocks packed by ``pack_blocks`` as views into ``data``."""
+    blocks = []
+    pos = 0
+    for n in np.diff(offsets).tolist():
+        blocks.append(data[pos:pos + n * n].reshape(n, n))
+        pos += n * n
+    return blocks
+
+
+def sparse_block_diag(blocks: List[np.ndarray]) -> "scipy.sparse.bsr_matrix":
+    """Assemble square blocks into a sparse BSR matrix without a dense temporary."""
+    import scipy.sparse as sp  # SciPy is only needed for sparse output
+    # scipy.sparse has no float16, so half-precision blocks go in as float32
+    return sp.block_diag([sp.csr_matrix(b.astype(np.float32) if b.dtype == np.float16 else b)
+                          for b in blocks],
+                         format="bsr")
+
+
+def write_block_diag(out_path: Path,
+                     blocks: List[np.ndarray],
+                     precision: int = 5) -> int:
+    """Stream the block-diagonal matrix to a dense text file; return its size.
+
+    Rows are written one block at a time, so the full N × N matrix is never
+    held in memory.  The off-block zeros are formatted once per block as
+    fixed text around a row template, leaving only the block's own values
+    to go through ``%`` formatting (the output matches ``np.savetxt``).
+    """
+    n = sum(b.shape[0] for b in blocks)
+    zero = f"{0:.{precision}f}"
+    start = 0
+    with out_path.open("w") as fh:
+        for b in blocks:
+            stop = start + b.shape[0]
+            line = " ".join([zero] * start
+                            + [f"%.{precision}f"] * b.shape[0]
+                            + [zero] * (n - stop)) + "\n"
+            # tolist() converts the block to Python floats in one C pass,
+            # so % never has to unbox NumPy scalars one by one
+            fh.writelines(line % tuple(row) for row in b.tolist())
+            start = stop
+    return n
+
+
+def write_block_diag_mtx(out_path: Path,
+                         blocks: List[np.ndarray],
+                         precision: int = 5) -> int:
+    """Write the non-zero entries as a Matrix Market file; return the size.
+
+    Values are rounded to ``precision`` decimal places to match the text
+    output, then written in their shortest exact form.
+    """
+    from scipy.io import mmwrite
+    combined = sparse_block_diag(blocks)
+    combined.data = np.round(combined.data, precision)
+    with out_path.open("wb") as fh:
+        mmwrite(fh, combined)
+    return combined.shape[0]
+
+
+def write_block_diag_coo(out_path: Path,
+                         blocks: List[np.ndarray],
+                         precision: int = 5) -> int:
+    """Write the non-zero entries as ``row col value`` lines; return the size.
+
+    Indices are 0-based positions in the combined matrix, listed block by
+    block in row-major order, so the file grows with the non-zeros rather
+    than with N².
+    """
+    line = f"%d %d %.{precision}f\n"
+    start = 0
+    with out_path.open("w") as fh:
+        for b in blocks:
+            rows, cols = np.nonzero(b)
+            fh.writelines(line % entry
+                          for entry in zip((rows + start).tolist(),
+                                           (cols + start).tolist(),
+                                           b[rows, cols].tolist()))
+            start += b.shape[0]
+    return start
+
+
+def write_block_diag_npy(out_path: Path, blocks: List[np.ndarray]) -> np.ndarray:
+    """Write the block-diagonal matrix as a binary .npy file; return the offsets.
+
+    The matrix is filled through a disk-backed memmap, so it is never held in
+    memory.  A ``.blocks.npz`` sidecar stores the blocks alone, packed by
+    ``pack_blocks`` as ``data`` plus ``offsets``, so readers can rebuild them
+    with ``unpack_blocks`` without touching the N² file at all.
+    """
+    data, offsets = pack_blocks(blocks)
+    n = int(offsets[-1])
+    combined = np.lib.format.open_memmap(out_path, mode="w+",
+                                         dtype=data.dtype, shape=(n, n))
+    block_diag(blocks, out=combined)
+    combined.flush()
+    del combined
+    np.savez(out_path.with_suffix(".blocks.npz"), data=data, offsets=offsets)
+    return offsets
+
+
 def combine_edge_folder(folder: Path,
                         output_name: str = "total.edge",
                         precision: int = 5,
-                        sort_mode: str = "directory") -> Path:
-    """Assemble .edge files into one block-diagonal file with specified sorting."""
+                        sort_mode: str = "directory",
+                        output_format: str = "dense",
+                        jobs: Optional[int] = None,
+                        dtype: DTypeLike = np.float64) -> Path:
+    """Assemble .edge files into one block-diagonal file with specified sorting.
+
+    ``output_format="sparse"`` writes the non-zero entries as a Matrix Market
+    file next to ``output_name`` (suffix ``.mtx``) instead of the dense text
+    matrix, so none of the off-diagonal zeros are ever stored.
+    ``output_format="coo"`` writes plain ``row col value`` triplets of the
+    non-zeros instead (suffix ``.coo``, 0-based indices).
+    ``output_format="binary"`` writes the full matrix in NumPy's ``.npy``
+    format plus a ``.blocks.npz`` file holding just the packed blocks.
+    ``dtype`` sets the type the blocks are parsed into; ``np.float32`` halves
+    memory and binary file size and is ample for up to ~7 significant digits.
+    """
     edge_files = [p for p in folder.glob("*.edge") if p.name != output_name]
     if not edge_files:
         raise FileNotFoundError("No .edge files found in the folder.")
@@ -53,7 +449,9 @@ def combine_edge_folder(folder: Path,
         edge_files.sort()  # alphabetical order
         sort_description = "alphabetical order"
     elif sort_mode == "size":
-        edge_files.sort(key=edge_size, reverse=True)  # largest matrix first
+        # Bytes on disk give a cheap first ordering (one stat() per file);
+        # it is refined below once the parsed dimensions are known
+        edge_files.sort(key=lambda p: p.stat().st_size, reverse=True)
         sort_description = "size (largest first)"
     else:  # directory order (default)
         # Keep the order as found by glob, which is typically directory order
@@ -61,19 +459,32 @@ def combine_edge_folder(folder: Path,
         edge_files = sorted(edge_files, key=lambda x: x.name)
         sort_description = "directory order"
     
-    blocks = [read_edge(p) for p in edge_files]
-    combined = block_diag(*blocks)
+    blocks = read_edges(edge_files, jobs=jobs, dtype=dtype)
+    if sort_mode == "size" and blocks:
+        # The parse yields the true dimensions for free; a stable re-sort
+        # fixes any place where bytes on disk misjudged the matrix size
+        order = sorted(range(len(blocks)),
+                       key=lambda i: blocks[i].shape[0], reverse=True)
+        edge_files = [edge_files[i] for i in order]
+        blocks = [blocks[i] for i in order]
     
-    out_path = folder / output_name
-    np.savetxt(out_path,
-               combined,
-               fmt=f"%.{precision}f",
-               delimiter=" ")
+    if output_format == "sparse":
+        out_path = (folder / output_name).with_suffix(".mtx")
+        n = write_block_diag_mtx(out_path, blocks, precision)
+    elif output_format == "coo":
+        out_path = (folder / output_name).with_suffix(".coo")
+        n = write_block_diag_coo(out_path, blocks, precision)
+    elif output_format == "binary":
+        out_path = (folder / output_name).with_suffix(".npy")
+        n = int(write_block_diag_npy(out_path, blocks)[-1])
+    else:  # dense text (default)
+        out_path = folder / output_name
+        n = write_block_diag(out_path, blocks, precision)
     
     print(f"\n✔ Combined order ({sort_description}):")
     for p, b in zip(edge_files, blocks):
         print(f"   {p.name:>15}   ({b.shape[0]} × {b.shape[0]})")
-    print(f"\n⭑ Saved {combined.shape[0]}×{combined.shape[1]} matrix → {out_path}")
+    print(f"\n⭑ Saved {n}×{n} matrix → {out_path}")
     
     return out_path
 
@@ -106,7 +517,33 @@ def main():
                            action="store_true",
                            help="Sort files by size (largest first)")
     
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=None,
+                        help="Worker processes for reading files (default: one per CPU)")
+    
+    parser.add_argument("--dtype",
+                        choices=["float64", "float32", "float16"],
+                        default="float64",
+                        help="Floating-point type for the matrix data; float32 "
+                             "halves memory and suits precision <= 7 "
+                             "(default: float64)")
+    
+    # Output formats - mutually exclusive (default: dense text)
+    format_group = parser.add_mutually_exclusive_group()
+    format_group.add_argument("--sparse",
+                              action="store_true",
+                              help="Write non-zeros only, as a Matrix Market .mtx file")
+    format_group.add_argument("--coo",
+                              action="store_true",
+                              help="Write non-zeros only, as 'row col value' lines")
+    format_group.add_argument("-b", "--binary",
+                              action="store_true",
+                              help="Write a binary .npy file plus the packed blocks (.blocks.npz)")
+    
     args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("-j/--jobs must be at least 1")
     
     # Determine sorting mode
     if args.alphabetical:
@@ -116,10 +553,23 @@ def main():
     else:
         sort_mode = "directory"  # default
     
+    # Determine output format
+    if args.sparse:
+        output_format = "sparse"
+    elif args.coo:
+        output_format = "coo"
+    elif args.binary:
+        output_format = "binary"
+    else:
+        output_format = "dense"  # default
+    
     combine_edge_folder(args.folder.resolve(),
                         output_name=args.output,
                         precision=args.precision,
-                        sort_mode=sort_mode)
+                        sort_mode=sort_mode,
+                        output_format=output_format,
+                        jobs=args.jobs,
+                        dtype=args.dtype)
 
 
 if __name__ == "__main__":
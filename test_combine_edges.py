@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+import combine_edges
+
+
+def _load(tmp_path, text):
+    path = tmp_path / "m.edge"
+    path.write_bytes(text)
+    return combine_edges._load_edge(path)
+
+
+@pytest.mark.parametrize("token", [
+    b"900719925474099.9",     # mantissa 2**53 + 7 once the last digit lands
+    b"0.9007199254740993",    # mantissa 2**53 + 1
+    b"9007199254740993",
+])
+def test_mantissa_just_above_2_53_is_correctly_rounded(tmp_path, token):
+    arr = _load(tmp_path, token + b"\n")
+    assert arr[0, 0] == float(token)
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_whitespace_only_file_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        _load(tmp_path, b" \n\t\n")
+
+
+@pytest.mark.parametrize("text", [
+    b"1 2 3\n4 5\n6 7 8 9\n",
+    b"1 2\n3 4 5 6\n7\n8 9\n",
+])
+def test_ragged_file_is_rejected(tmp_path, text):
+    with pytest.raises(ValueError):
+        _load(tmp_path, text)
+
+
+def test_parallel_read_keeps_file_order(tmp_path):
+    paths = []
+    for k, n in enumerate([3, 1, 5, 2, 4, 6, 2, 3]):
+        path = tmp_path / f"{k}.edge"
+        np.savetxt(path, np.full((n, n), float(k)), fmt="%.1f")
+        paths.append(path)
+    parallel = combine_edges.read_edges(paths, jobs=2)
+    sequential = combine_edges.read_edges(paths, jobs=1)
+    assert len(parallel) == len(paths)
+    for p, s in zip(parallel, sequential):
+        np.testing.assert_array_equal(p, s)
+
+
+
+def test_uncached_read_returns_writable_array(tmp_path):
+    path = tmp_path / "m.edge"
+    path.write_bytes(b"1 2\n3 4\n")
+    combine_edges.clear_block_cache()
+    arr = combine_edges.read_edge(path)
+    assert arr.flags.writeable
+    assert not combine_edges._block_cache
+
+
+def test_cached_read_reparses_an_edited_file(tmp_path):
+    path = tmp_path / "m.edge"
+    path.write_bytes(b"1 2\n3 4\n")
+    combine_edges.clear_block_cache()
+    first = combine_edges.read_edge(path, cache=True)
+    assert combine_edges.read_edge(path, cache=True) is first
+    path.write_bytes(b"5 6 7\n8 9 10\n11 12 13\n")
+    second = combine_edges.read_edge(path, cache=True)
+    assert second.shape == (3, 3) and second[0, 0] == 5
+    assert combine_edges._block_cache_bytes == sum(
+        a.nbytes for a in combine_edges._block_cache.values())
+    combine_edges.clear_block_cache()
+
+
+def _blocks():
+    rng = np.random.default_rng(0)
+    blocks = [rng.random((n, n)) * (rng.random((n, n)) > 0.3) for n in (3, 1, 4)]
+    blocks[0][0, 0] = -2.5
+    return blocks
+
+
+def test_dense_output_streams_the_block_diagonal_matrix(tmp_path):
+    blocks = _blocks()
+    out = tmp_path / "total.edge"
+    assert combine_edges.write_block_diag(out, blocks, precision=8) == 8
+    np.testing.assert_allclose(np.loadtxt(out), combine_edges.block_diag(blocks),
+                               atol=1e-8)
+
+
+@pytest.mark.parametrize("precision", [0, 3, 5])
+def test_dense_output_matches_np_savetxt_byte_for_byte(tmp_path, precision):
+    blocks = _blocks()
+    ours, ref = tmp_path / "ours.edge", tmp_path / "ref.edge"
+    combine_edges.write_block_diag(ours, blocks, precision)
+    np.savetxt(ref, combine_edges.block_diag(blocks),
+               fmt=f"%.{precision}f", delimiter=" ")
+    assert ours.read_bytes() == ref.read_bytes()
+
+
+def test_binary_output_round_trips_through_unpack_blocks(tmp_path):
+    blocks = _blocks()
+    out = tmp_path / "total.npy"
+    offsets = combine_edges.write_block_diag_npy(out, blocks)
+    np.testing.assert_array_equal(np.load(out), combine_edges.block_diag(blocks))
+    with np.load(tmp_path / "total.blocks.npz") as packed:
+        np.testing.assert_array_equal(packed["offsets"], offsets)
+        unpacked = combine_edges.unpack_blocks(packed["data"], packed["offsets"])
+    assert len(unpacked) == len(blocks)
+    for got, want in zip(unpacked, blocks):
+        np.testing.assert_array_equal(got, want)
+
+
+def test_coo_output_lists_nonzeros_with_global_indices(tmp_path):
+    blocks = _blocks()
+    out = tmp_path / "total.coo"
+    assert combine_edges.write_block_diag_coo(out, blocks, precision=8) == 8
+    triplets = np.loadtxt(out, ndmin=2)
+    rows, cols = triplets[:, 0].astype(int), triplets[:, 1].astype(int)
+    dense = combine_edges.block_diag(blocks)
+    assert len(triplets) == np.count_nonzero(dense)
+    np.testing.assert_array_equal(dense[rows, cols] != 0, True)
+    rebuilt = np.zeros_like(dense)
+    rebuilt[rows, cols] = triplets[:, 2]
+    np.testing.assert_allclose(rebuilt, dense, atol=1e-8)